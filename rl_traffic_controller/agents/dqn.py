@@ -6,19 +6,26 @@ from functools import partial
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 
 from rl_traffic_controller import consts
 from rl_traffic_controller.environment import Environment
-from rl_traffic_controller.utils import ReplayMemory, Transition
+from rl_traffic_controller.utils import ReplayMemory
 
 # Choose cuda if a GPU is available
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 logger = logging.getLogger(__name__)
 
+# Mixed precision is only used on GPUs, where it enables the Tensor Cores.
+use_amp = device.type == "cuda"
+autocast = partial(torch.autocast, device_type=device.type, dtype=torch.float16, enabled=use_amp)
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Allow TF32 for the remaining float32 operations and let cuDNN benchmark
+# the convolution algorithms for the fixed input size.
+torch.set_float32_matmul_precision("high")
+torch.backends.cudnn.benchmark = True
 
 # Partial functions to set default arguments for layers.
 conv2d = partial(nn.Conv2d, device=device, dtype=torch.float32)
@@ -27,7 +34,17 @@ linear = partial(nn.Linear, device=device, dtype=torch.float32)
 
 
 class DQN(nn.Module):
-    """A CNN to predict Q-values."""
+    """A CNN to predict Q-values.
+    
+    The output layer is padded to a multiple of 8 features so that the Tensor Core
+    kernels can be used, the extra outputs are dropped in `forward`.
+    
+    Attributes:
+        n_actions: The number of available actions.
+        n_outputs: The padded number of outputs of the last layer.
+    """
+    n_actions = 4
+    n_outputs = 8
 
     def __init__(self) -> None:
         super(DQN, self).__init__()
@@ -42,10 +59,21 @@ class DQN(nn.Module):
             nn.ReLU(),
             batchnorm(64),
             nn.Flatten(),
-            linear(78848, 4)
+            linear(78848, self.n_outputs)
         )
         
+        self._register_load_state_dict_pre_hook(self._pad_output_layer)
+        
         logger.debug(f"Created DQN.\n{self.layer_stack!r}")
+    
+    def _pad_output_layer(self, state_dict: dict, prefix: str, *args) -> None:
+        """Zero-pads the output layer of networks saved before it was padded."""
+        for name in ("weight", "bias"):
+            key = f"{prefix}layer_stack.{len(self.layer_stack) - 1}.{name}"
+            param = state_dict.get(key)
+            if param is not None and param.shape[0] < self.n_outputs:
+                padding = (0, 0) * (param.dim() - 1) + (0, self.n_outputs - param.shape[0])
+                state_dict[key] = F.pad(param, padding)
 
     # Called with either one element to determine next action, or a batch
     # during optimization. Returns tensor([[left0exp,right0exp]...]).
@@ -53,12 +81,12 @@ class DQN(nn.Module):
         """Implements the forward step for the network.
         
         Args:
-            x: The input tensor.
+            x: The input tensor, observations are stored as `torch.uint8`.
         
         Returns:
             The output of the network in the form of a tensor.
         """
-        return self.layer_stack(x)
+        return self.layer_stack(x.to(torch.float32))[:, :self.n_actions]
 
 
 class DQNAgent:
@@ -76,6 +104,7 @@ class DQNAgent:
         target_net: The target Q-network.
         n_actions: The number of available actions.
         optimizer: The optimization function.
+        scaler: The gradient scaler used with mixed precision.
         loss_fn: The loss function.
         memory: The replay memory.
         steps_done: A time step counter used to calculate the epsilon threshold.
@@ -120,10 +149,17 @@ class DQNAgent:
         else:
             self.target_net.load_state_dict(self.policy_net.state_dict())
             self.steps_done = 0
+        
+        # Compile the networks in place to fuse their kernels, this keeps the
+        # parameter names of the saved state dicts unchanged.
+        if device.type == "cuda":
+            self.policy_net.compile()
+            self.target_net.compile()
 
         self.optimizer = optim.AdamW(self.policy_net.parameters(), lr=self.LR, amsgrad=True)
+        self.scaler = torch.cuda.amp.GradScaler(enabled=use_amp)
         self.loss_fn = nn.SmoothL1Loss()
-        self.memory = ReplayMemory(consts.MEMORY_SIZE)
+        self.memory = ReplayMemory(consts.MEMORY_SIZE, device)
         
         logger.debug(
             "Created agent with hyperparameters:\n" +
@@ -146,11 +182,15 @@ class DQNAgent:
             An action index wrapped in a 2D tensor.
         """
         sample = random.random()
-        eps_threshold = self.EPS_END + (self.EPS_START - self.EPS_END) * \
-            math.exp(-1. * self.steps_done / self.EPS_DECAY)
+        # After 10 decay periods epsilon is less than 1e-4 away from its final value
+        if self.steps_done > 10 * self.EPS_DECAY:
+            eps_threshold = self.EPS_END
+        else:
+            eps_threshold = self.EPS_END + (self.EPS_START - self.EPS_END) * \
+                math.exp(-1. * self.steps_done / self.EPS_DECAY)
         self.steps_done += 1
         if sample > eps_threshold:
-            with torch.no_grad():
+            with torch.no_grad(), autocast():
                 # t.max(1) will return the largest column value of each row.
                 # second column on max result is index of where max element was
                 # found, so we pick action with the largest expected reward.
@@ -174,29 +214,21 @@ class DQNAgent:
             )
             return
         
-        transitions = self.memory.sample(self.BATCH_SIZE)
-        # Transpose the batch (see https://stackoverflow.com/a/19343/3343043 for
-        # detailed explanation). This converts batch-array of Transitions
-        # to Transition of batch-arrays.
-        batch = Transition(*zip(*transitions))
+        batch = self.memory.sample(self.BATCH_SIZE)
 
-        # Compute a mask of non-final states and concatenate the batch elements
+        # Select the non-final next states
         # (a final state would've been the one after which simulation ended)
-        non_final_mask = torch.tensor(
-            tuple(map(lambda s: s is not None, batch.next_state)),
-            device=device, dtype=torch.bool
-        )
-        non_final_next_states = torch.cat(
-            [s for s in batch.next_state if s is not None]
-        )
-        state_batch = torch.cat(batch.state)
-        action_batch = torch.cat(batch.action)
-        reward_batch = torch.cat(batch.reward)
+        non_final_mask = ~batch.done
+        non_final_next_states = batch.next_state[non_final_mask]
+        state_batch = batch.state
+        action_batch = batch.action
+        reward_batch = batch.reward
 
         # Compute Q(s_t, a) - the model computes Q(s_t), then we select the
         # columns of actions taken. These are the actions which would've been taken
         # for each batch state according to policy_net
-        state_action_values = self.policy_net(state_batch).gather(1, action_batch)
+        with autocast():
+            state_action_values = self.policy_net(state_batch).gather(1, action_batch)
 
         # Compute V(s_{t+1}) for all next states.
         # Expected values of actions for non_final_next_states are computed based
@@ -204,23 +236,47 @@ class DQNAgent:
         # This is merged based on the mask, such that we'll have either the expected
         # state value or 0 in case the state was final.
         next_state_values = torch.zeros(self.BATCH_SIZE, device=device)
-        with torch.no_grad():
-            next_state_values[non_final_mask] = self.target_net(non_final_next_states).max(1).values
+        with torch.no_grad(), autocast():
+            next_state_values[non_final_mask] = self.target_net(non_final_next_states).max(1).values.float()
         # Compute the expected Q values
         expected_state_action_values = (next_state_values * self.GAMMA) + reward_batch
 
         # Compute Huber loss
-        loss = self.loss_fn(state_action_values, expected_state_action_values.unsqueeze(1))
+        with autocast():
+            loss = self.loss_fn(state_action_values, expected_state_action_values.unsqueeze(1))
         logger.info(f"Training loss: {loss}")
 
         # Optimize the model
         self.optimizer.zero_grad()
-        loss.backward()
-        # In-place gradient clipping
+        self.scaler.scale(loss).backward()
+        # Unscale the gradients before the in-place gradient clipping
+        self.scaler.unscale_(self.optimizer)
         torch.nn.utils.clip_grad_value_(self.policy_net.parameters(), 100)
-        self.optimizer.step()
+        self.scaler.step(self.optimizer)
+        self.scaler.update()
         logger.debug("Finished optimization step.")
-    
+
+    @torch.no_grad()
+    def update_target_net(self) -> None:
+        """Performs an in-place soft update of the target network's weights.
+
+        θ′ ← τ θ + (1 −τ )θ′
+        """
+        target_params = self.target_net.parameters()
+        policy_params = self.policy_net.parameters()
+        for target_param, policy_param in zip(target_params, policy_params):
+            target_param.mul_(1 - self.TAU).add_(policy_param, alpha=self.TAU)
+
+        # Buffers (batch norm running statistics) follow the same update,
+        # the integer batch counters are copied as they can't be interpolated.
+        target_buffers = self.target_net.buffers()
+        policy_buffers = self.policy_net.buffers()
+        for target_buffer, policy_buffer in zip(target_buffers, policy_buffers):
+            if target_buffer.is_floating_point():
+                target_buffer.mul_(1 - self.TAU).add_(policy_buffer, alpha=self.TAU)
+            else:
+                target_buffer.copy_(policy_buffer)
+
     def train(
         self,
         env: Environment,
@@ -250,13 +306,10 @@ class DQNAgent:
                 
                 logger.debug(f"Received reward {reward.item()!r}.")
 
-                if done:
-                    next_state = None
-                else:
-                    next_state = observation.unsqueeze(0)
+                next_state = observation.unsqueeze(0)
 
                 # Store the transition in memory
-                self.memory.push(state, action, next_state, reward)
+                self.memory.push(state, action, next_state, reward, done)
 
                 # Move to the next state
                 state = next_state
@@ -269,12 +322,7 @@ class DQNAgent:
                     break
             
             # Soft update of the target network's weights
-            # θ′ ← τ θ + (1 −τ )θ′
-            target_net_state_dict = self.target_net.state_dict()
-            policy_net_state_dict = self.policy_net.state_dict()
-            for key in policy_net_state_dict:
-                target_net_state_dict[key] = policy_net_state_dict[key] * self.TAU + target_net_state_dict[key] * (1 - self.TAU)
-            self.target_net.load_state_dict(target_net_state_dict)
+            self.update_target_net()
             
             logger.debug("Updated target network.")
             
@@ -4,6 +4,7 @@ import xml.etree.ElementTree as ET
 from collections import defaultdict
 
 import traci
+import traci.constants as tc
 import traci.exceptions
 from PIL import Image
 
@@ -63,9 +64,20 @@ class SUMOController:
                 self.detectors.append(prefix + "en")
                 self.detectors.append(prefix + "ex")
         
+        # Cache the count key of each detector and whether it's an entry detector
+        self.detector_meta = [
+            (detector, detector[:4], detector.endswith("n"))
+            for detector in self.detectors
+        ]
+        
         # Store the throughput during the last traffic phase
         self.throughput = 0
         self.vehicle_delays = defaultdict(float)
+        self.total_delay = 0.0
+        
+        # Parse the routes once, the flows are modified in place
+        self.route_tree = ET.parse(consts.SIMULATION_ROUTE_PATH)
+        self.flows = self.route_tree.getroot().findall('.//flow')
     
     def get_screenshot(self) -> Image.Image:
         """Takes a screenshot of the simulation, saves it to disk, and returns it.
@@ -133,6 +145,7 @@ class SUMOController:
         except traci.exceptions.TraCIException:
             self.detector_counts = defaultdict(int)
             self.vehicle_delays = defaultdict(float)
+            self.total_delay = 0.0
             traci.load(commands[1:])
         except FileNotFoundError:
             logger.error("SUMO is not available.")
@@ -141,6 +154,18 @@ class SUMOController:
             logger.exception("Couldn't start the simulation.")
             exit(-3)
         
+        self.subscribe()
+    
+    def subscribe(self) -> None:
+        """Subscribes to the simulation variables retrieved every step.
+        
+        The subscription results are sent by SUMO after each simulation step, which
+        avoids a request for every variable.
+        """
+        traci.simulation.subscribe([tc.VAR_MIN_EXPECTED_VEHICLES])
+        for detector in self.detectors:
+            traci.inductionloop.subscribe(detector, [tc.VAR_INTERVAL_NUMBER])
+        
     def step(self, seconds: int = 1) -> bool:
         """Runs the simulation for a given amount of time.
         
@@ -154,7 +179,8 @@ class SUMOController:
         
         for _ in range(steps):
             self.update_detectors()
-            if traci.simulation.getMinExpectedNumber() > 0:
+            results = traci.simulation.getSubscriptionResults()
+            if results[tc.VAR_MIN_EXPECTED_VEHICLES] > 0:
                 traci.simulationStep()
             else:
                 return False
@@ -180,25 +206,34 @@ class SUMOController:
         return result
     
     def get_avg_delay(self) -> float:
-        """Calculates the average delay of current vehicles.
+        """Calculates the average delay of the vehicles of the current simulation.
+        
+        Each vehicle is subscribed to once, and the total delay is updated with the
+        changes of the subscribed waiting times.
         
         Returns:
             The average delay.
         """
-        vehicles = traci.vehicle.getIDList()
-        for v in vehicles:
-            self.vehicle_delays[v] = traci.vehicle.getAccumulatedWaitingTime(v)
-        delay = sum(self.vehicle_delays.values())
-        return delay / len(self.vehicle_delays)
+        for v in traci.vehicle.getIDList():
+            if v not in self.vehicle_delays:
+                traci.vehicle.subscribe(v, [tc.VAR_ACCUMULATED_WAITING_TIME])
+        
+        for v, result in traci.vehicle.getAllSubscriptionResults().items():
+            delay = result[tc.VAR_ACCUMULATED_WAITING_TIME]
+            self.total_delay += delay - self.vehicle_delays[v]
+            self.vehicle_delays[v] = delay
+        
+        return self.total_delay / len(self.vehicle_delays)
     
     def update_detectors(self) -> None:
         """Calculates the number of vehicles between each pair of entry and exit detectors."""
-        for detector in self.detectors:
-            num = traci.inductionloop.getIntervalVehicleNumber(detector)
-            if detector.endswith("n"):
-                self.detector_counts[detector[:4]] += num
+        results = traci.inductionloop.getAllSubscriptionResults()
+        for detector, key, is_entry in self.detector_meta:
+            num = results[detector][tc.VAR_INTERVAL_NUMBER]
+            if is_entry:
+                self.detector_counts[key] += num
             else:
-                self.detector_counts[detector[:4]] -= num
+                self.detector_counts[key] -= num
                 self.throughput += num
     
     def shutdown(self) -> None:
@@ -208,14 +243,11 @@ class SUMOController:
     
     def tweak_probability(self) -> None:
         """Changes the probabilities of car flows."""
-        tree = ET.parse(consts.SIMULATION_ROUTE_PATH)
-        root = tree.getroot()
-
-        for flow in root.findall('.//flow'):
+        for flow in self.flows:
             probability = random.uniform(*consts.SIMULATION_FLOW_PROBABILITY)
             flow.set('probability', str(probability))
 
-        tree.write(consts.SIMULATION_ROUTE_PATH)
+        self.route_tree.write(consts.SIMULATION_ROUTE_PATH)
 
 
 class StubController:
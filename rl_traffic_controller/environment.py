@@ -52,14 +52,19 @@ class Environment:
             image: The raw image.
         
         Returns:
-            The new observation in the form of a `torch.Tensor`.
+            The new observation in the form of a `torch.uint8` tensor.
         """
-        image = image.resize(consts.IMAGE_SIZE).convert(consts.IMAGE_FORMAT)
-        observation = torch.tensor(
-            np.array(image),
-            dtype=torch.float32,
-            device=device
-        )
+        # Converting first means fewer channels are resampled
+        image = image.convert(consts.IMAGE_FORMAT).resize(consts.IMAGE_SIZE)
+        # `torch.from_numpy` shares the array memory, so the pixels are copied
+        # once from the image and once to the device. On CUDA, they are also
+        # copied to page-locked memory first, which allows the copy to the
+        # device to be asynchronous; the other two copies are synchronous.
+        observation = torch.from_numpy(np.array(image)).to(dtype=torch.uint8)
+        
+        if device.type == "cuda":
+            observation = observation.pin_memory()
+        observation = observation.to(device=device, non_blocking=True)
         
         if len(observation.shape) == 3:
             return observation.permute(2, 0, 1)
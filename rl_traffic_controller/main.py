@@ -1,7 +1,8 @@
 import logging
 import os
+from collections.abc import Iterator
+from functools import cache
 
-import matplotlib.pyplot as plt
 import numpy as np
 from PIL import Image, UnidentifiedImageError
 from rich import print
@@ -13,7 +14,17 @@ from rl_traffic_controller.environment import Environment, Metrics
 
 logger = logging.getLogger(__name__)
 
-plt.style.use('seaborn-v0_8-darkgrid')
+
+@cache
+def get_pyplot():
+    """Imports and styles `matplotlib.pyplot` the first time a plot is shown.
+    
+    Returns:
+        The `matplotlib.pyplot` module.
+    """
+    import matplotlib.pyplot as plt
+    plt.style.use('seaborn-v0_8-darkgrid')
+    return plt
 
 
 def get_agent_class(
@@ -42,8 +53,12 @@ def plot_metrics(metrics: Metrics) -> None:
     Args:
         metrics: The environment metrics.
     """
+    plt = get_pyplot()
+    
     def moving_average(data, window_size):
-        return np.convolve(data, np.ones(window_size) / window_size, mode='valid')
+        # Each window sum is the difference of two cumulative sums
+        cumsum = np.cumsum(np.insert(np.asarray(data, dtype=float), 0, 0))
+        return (cumsum[window_size:] - cumsum[:-window_size]) / window_size
     
     n = len(metrics.avg_delay)
     
@@ -86,7 +101,7 @@ def train(
     load_nets: bool = False,
     save: bool = False,
     num_episodes: int = 50,
-    image_paths: list[str] = [],
+    image_paths: list[str] | None = None,
     plot: bool = False,
 ) -> None:
     """Trains the agent.
@@ -114,8 +129,8 @@ def train(
     
     logger.info('Finished training.')
     
-    if len(image_paths) > 0:
-        evaluate(image_paths, agent)
+    if image_paths:
+        evaluate(image_paths, agent_name, agent)
     
     if plot is True:
         plot_metrics(env.avg_metrics)
@@ -162,6 +177,8 @@ def display_results(
         result: The image of the chosen action.
         action_value: The Q value of the chosen action.
     """
+    plt = get_pyplot()
+    
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 5))
         
     ax1.imshow(np.array(image))
@@ -177,56 +194,64 @@ def display_results(
     plt.show()
 
 
+def iter_image_paths(image_paths: list[str]) -> Iterator[str]:
+    """Yields the image paths, expanding directories into the images they contain.
+    
+    Args:
+        image_paths: A list of image paths and/or directories containing images.
+    
+    Yields:
+        The path of each image.
+    """
+    for path in image_paths:
+        if os.path.isdir(path):
+            for file in os.listdir(path):
+                _, ext = os.path.splitext(file)
+                if ext in consts.IMAGE_EXTENSIONS:
+                    yield os.path.join(path, file)
+        else:
+            yield path
+
+
 def evaluate(
     image_paths: list[str],
-    agent_name: str
+    agent_name: str,
+    agent: DQNAgent | None = None,
 ) -> None:
     """Prints the action chosen by the agent given the input observations.
     
     Args:
-        image_paths: A list of image paths representing observations.
+        image_paths: A list of image paths and/or directories containing images
+            representing observations.
+        agent_name: The name of the agent to evaluate.
         agent: An optional agent that is already initialized.
     """
-    agent_class = get_agent_class(agent_name)
-    agent = agent_class(load_nets=True)
+    if agent is None:
+        agent_class = get_agent_class(agent_name)
+        agent = agent_class(load_nets=True)
+    
+    for path in iter_image_paths(image_paths):
+        try:
+            image = Image.open(path)
+        except FileNotFoundError:
+            logger.warning(f"Image {path!r} does not exist.")
+            continue
+        except UnidentifiedImageError:
+            logger.warning(f"{path!r} is not an image or is a corrupted image.")
+            continue
+        except Exception:
+            logger.warning(f"Error while opening {path!r}.")
+            continue
         
-    for path in image_paths:
-        is_dir = os.path.isdir(path)
+        state = Environment.image_to_observation(image)
         
-        paths = []
-        if is_dir is True:
-            for file in os.listdir(path):
-                _, ext = os.path.splitext(file)
-                if ext in consts.IMAGE_EXTENSIONS:
-                    paths.append(
-                        os.path.join(path, file)
-                    )
-        else:
-            paths.append(path)
+        values, action = agent.evaluate(state)
+        
+        print(
+            f"\nAction values for {path!r} are {values!r}.\n",
+            f"The chosen action is [bold blue]phase {action!r}[/bold blue].\n"
+        )
+        
+        result = Image.open(f"data/phase{action}.jpg")
         
-        for path in paths:
-            
-            try:
-                image = Image.open(path)
-            except FileNotFoundError:
-                logger.warning(f"Image {path!r} does not exist.")
-                continue
-            except UnidentifiedImageError:
-                logger.warning(f"{path!r} is not an image or is a corrupted image.")
-                continue
-            except Exception:
-                logger.warning(f"Error while opening {path!r}.")
-                continue
-            
-            state = Environment.image_to_observation(image)
-            
-            values, action = agent.evaluate(state)
-            
-            print(
-                f"\nAction values for {path!r} are {values!r}.\n",
-                f"The chosen action is [bold blue]phase {action!r}[/bold blue].\n"
-            )
-            
-            result = Image.open(f"data/phase{action}.jpg")
-            
-            display_results(image, result, values[action], path)
+        display_results(image, result, values[action], path)
@@ -1,10 +1,11 @@
-import random
-from collections import deque, namedtuple
+from collections import namedtuple
+
+import torch
 
 
 Transition = namedtuple(
     'Transition',
-    ('state', 'action', 'next_state', 'reward')
+    ('state', 'action', 'next_state', 'reward', 'done')
 )
 Transition.__doc__ = """\
 A data record of the environment transition.
@@ -14,41 +15,102 @@ Attributes:
     action: Action taken.
     next_state: Resulting observation.
     reward: Reward earned.
+    done: Indicate if the resulting observation is final.
 """
 
 
 class ReplayMemory:
     """A memory buffer to store and sample transitions.
     
+    Each element of the transitions is stored in its own pre-allocated tensor, so
+    sampling a batch is a single indexing operation for each element.
+    
     Attributes:
-        memory: A `collection.deque` object to hold transitions.
+        capacity: Maximum number of stored transitions.
+        device: The device the transitions are stored on.
+        states: The stored states, allocated on the first push.
+        actions: The stored actions.
+        next_states: The stored resulting observations, allocated on the first push.
+        rewards: The stored rewards.
+        dones: The stored flags indicating final observations.
+        position: The index where the next transition is stored.
+        size: The number of stored transitions.
     """
 
-    def __init__(self, capacity: int) -> None:
+    def __init__(self, capacity: int, device: torch.device = torch.device("cpu")) -> None:
         """
         Args:
             capacity: Maximum number of stored transitions.
+            device: The device the transitions are stored on.
+        """
+        self.capacity = capacity
+        self.device = device
+        
+        self.states = None
+        self.actions = torch.empty(capacity, 1, dtype=torch.long, device=device)
+        self.next_states = None
+        self.rewards = torch.empty(capacity, dtype=torch.float32, device=device)
+        self.dones = torch.zeros(capacity, dtype=torch.bool, device=device)
+        
+        self.position = 0
+        self.size = 0
+    
+    def _allocate_states(self, state: torch.Tensor) -> None:
+        """Allocates the state tensors using the shape of the first state.
+        
+        Args:
+            state: A batched state of size 1.
         """
-        self.memory = deque([], maxlen=capacity)
+        shape = (self.capacity, *state.shape[1:])
+        self.states = torch.empty(shape, dtype=state.dtype, device=self.device)
+        self.next_states = torch.empty_like(self.states)
 
-    def push(self, *args):
-        """Saves a transition.
+    def push(
+        self,
+        state: torch.Tensor,
+        action: torch.Tensor,
+        next_state: torch.Tensor,
+        reward: torch.Tensor,
+        done: bool,
+    ) -> None:
+        """Saves a transition, overwriting the oldest one if the memory is full.
         
         Args:
-            *args: Transition elements.
+            state: Current state.
+            action: Action taken.
+            next_state: Resulting observation.
+            reward: Reward earned.
+            done: Indicate if the resulting observation is final.
         """
-        self.memory.append(Transition(*args))
+        if self.states is None:
+            self._allocate_states(state)
+        
+        self.states[self.position] = state[0]
+        self.actions[self.position] = action[0]
+        self.next_states[self.position] = next_state[0]
+        self.rewards[self.position] = reward[0]
+        self.dones[self.position] = done
+        
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
 
-    def sample(self, batch_size: int) -> list[Transition]:
+    def sample(self, batch_size: int) -> Transition:
         """Samples a random number of transitions.
         
         Args:
             batch_size: Number of randomly sampled transitions.
         
         Returns:
-            A list of sampled transitions.
+            A transition of batches.
         """
-        return random.sample(self.memory, batch_size)
+        indices = torch.randint(self.size, (batch_size,), device=self.device)
+        return Transition(
+            self.states[indices],
+            self.actions[indices],
+            self.next_states[indices],
+            self.rewards[indices],
+            self.dones[indices],
+        )
 
     def __len__(self) -> int:
-        return len(self.memory)
+        return self.size
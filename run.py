@@ -1,79 +1,227 @@
-#!/usr/bin/bash python3
-
-import argparse
-from functools import partial
-
-from rich import print
-
-from rl_traffic_controller.main import demo, evaluate, train
-
-parser = argparse.ArgumentParser()
-
-parser.add_argument(
-    "mode", type=str, help="train or eval or demo or dry-run"
-)
-parser.add_argument(
-    "-c", "--continue", action="store_true", dest="load_nets",
-    help="load the saved networks and continue training"
-)
-parser.add_argument(
-    "-s", "--save", action="store_true", dest="save",
-    help="save the networks after every training episode"
-)
-parser.add_argument(
-    "-p", "--plot", action="store_true",
-    help="plot the metrics after training"
-)
-parser.add_argument(
-    "-e", "--episodes", type=int, default=1, metavar="N",
-    help="number of episodes sampled during training (default: %(default)s)"
-)
-parser.add_argument(
-    "-a", "--agent", type=str, default="dqn", metavar="agent_name", dest="agent_name",
-    help="which agent to use, dqn or fixed (default: %(default)s)"
-)
-parser.add_argument(
-    "--images", type=str, nargs="+", action="extend", metavar="", dest="image_paths", default=[],
-    help="paths of images (observations), and/or directories containing images, to test the agent on"
-)
-
-args = parser.parse_args()
-
-train = partial(
-    train,
-    agent_name=args.agent_name,
-    load_nets=args.load_nets,
-    save=args.save,
-    num_episodes=args.episodes,
-    image_paths=args.image_paths,
-    plot=args.plot,
-)
-
-mode = args.mode.lower()
-if mode == "train":
-    train()
-elif mode == "dry-run":
-    train(stub=True)
-elif mode == "eval":
-    if args.image_paths is None:
+#!/usr/bin/env python3
+
+import sys
+from types import SimpleNamespace
+
+USAGE = """\
+usage: run.py [-h] [-c] [-s] [-p] [-e N] [-a agent_name] [--images [...]] mode
+"""
+
+HELP = USAGE + """
+positional arguments:
+  mode                  train or eval or demo or dry-run
+
+options:
+  -h, --help            show this help message and exit
+  -c, --continue        load the saved networks and continue training
+  -s, --save            save the networks after every training episode
+  -p, --plot            plot the metrics after training
+  -e N, --episodes N    number of episodes sampled during training (default: 1)
+  -a agent_name, --agent agent_name
+                        which agent to use, dqn or fixed (default: dqn)
+  --images [ ...]       paths of images (observations), and/or directories containing
+                        images, to test the agent on
+
+long options can't be abbreviated (e.g. '--epi' for '--episodes').
+"""
+
+
+def run_train(args) -> None:
+    """Trains the agent, using a stub simulation in 'dry-run' mode."""
+    if args.image_paths and args.agent_name.lower() == "fixed":
+        from rich import print
+        
+        print(
+            "[red]ERROR[/red]: The 'fixed' agent doesn't support the '--images' option.",
+            file=sys.stderr,
+        )
+        sys.exit(-7)
+    
+    from rl_traffic_controller.main import train
+    
+    train(
+        agent_name=args.agent_name,
+        stub=args.mode == "dry-run",
+        load_nets=args.load_nets,
+        save=args.save,
+        num_episodes=args.episodes,
+        image_paths=args.image_paths,
+        plot=args.plot,
+    )
+
+
+def run_eval(args) -> None:
+    """Evaluates the agent on the given images."""
+    from rich import print
+    
+    if not args.image_paths:
         print(
             "[red]ERROR[/red]: You must use the '--images' option when using 'eval' mode.",
-            "Use 'python3.11 run.py --help' to know more."
+            "Use 'python3.11 run.py --help' to know more.",
+            file=sys.stderr,
         )
-        exit(-6)
+        sys.exit(-6)
     if args.agent_name.lower() == "fixed":
         print(
-            "[red]ERROR[/red]: The 'fixed' agent doesn't support 'eval' mode."
+            "[red]ERROR[/red]: The 'fixed' agent doesn't support 'eval' mode.",
+            file=sys.stderr,
         )
-        exit(-7)
+        sys.exit(-7)
+    
+    from rl_traffic_controller.main import evaluate
+    
     evaluate(
         agent_name=args.agent_name,
         image_paths=args.image_paths
     )
-elif mode == "demo":
+
+
+def run_demo(args) -> None:
+    """Runs a demo of the agent."""
+    from rl_traffic_controller.main import demo
+    
     demo(agent_name=args.agent_name, plot=args.plot, episodes=args.episodes)
-else:
+
+
+def invalid_mode(mode: str) -> None:
+    """Reports an unknown mode and exits."""
+    from rich import print
+    
     print(
-        f"[red]ERROR[/red]: Invalid mode '{mode}'. Use 'python3.11 run.py --help' to know more."
+        f"[red]ERROR[/red]: Invalid mode '{mode}'. Use 'python3.11 run.py --help' to know more.",
+        file=sys.stderr,
+    )
+    sys.exit(2)
+
+
+# The package is imported only by the modes that use it, as it loads torch.
+MODES = {
+    "train": run_train,
+    "dry-run": run_train,
+    "eval": run_eval,
+    "demo": run_demo,
+}
+
+
+def parse_error(message: str) -> None:
+    """Prints the usage and the error message, then exits like `argparse`."""
+    sys.stderr.write(f"{USAGE}run.py: error: {message}\n")
+    sys.exit(2)
+
+
+def parse_args(argv: list[str]) -> SimpleNamespace:
+    """Parses the command line arguments.
+    
+    The options are few and fixed, so they are parsed by hand instead of importing
+    and building an `argparse` parser. An unknown mode is rejected as soon as it's
+    found.
+    
+    Args:
+        argv: The command line arguments, without the program name.
+    
+    Returns:
+        The parsed arguments.
+    """
+    args = SimpleNamespace(
+        mode=None,
+        load_nets=False,
+        save=False,
+        plot=False,
+        episodes=1,
+        agent_name="dqn",
+        image_paths=None,
     )
-    exit(-1)
+    flags = {"c": "load_nets", "s": "save", "p": "plot"}
+    long_flags = {"--continue": "c", "--save": "s", "--plot": "p"}
+    long_values = {"--episodes": "e", "--agent": "a"}
+    
+    def set_value(short: str, value: str | None, i: int) -> int:
+        """Sets the value of `-e` or `-a`, reading it from the next argument if needed."""
+        name = "-e/--episodes" if short == "e" else "-a/--agent"
+        if value is None:
+            i += 1
+            if i == len(argv) or argv[i].startswith("-"):
+                parse_error(f"argument {name}: expected one argument")
+            value = argv[i]
+        if short == "a":
+            args.agent_name = value
+        else:
+            try:
+                args.episodes = int(value)
+            except ValueError:
+                parse_error(f"argument {name}: invalid int value: {value!r}")
+        return i
+    
+    def set_mode(arg: str) -> None:
+        """Sets the mode, rejecting an extra positional or an unknown mode."""
+        if args.mode is not None:
+            parse_error(f"unrecognized arguments: {arg}")
+        args.mode = sys.intern(arg.lower())
+        if args.mode not in MODES:
+            invalid_mode(args.mode)
+    
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        
+        if arg == "--":
+            # Everything after "--" is positional
+            for positional in argv[i + 1:]:
+                set_mode(positional)
+            break
+        elif arg.startswith("--"):
+            option, has_value, value = arg.partition("=")
+            if option == "--help" and not has_value:
+                sys.stdout.write(HELP)
+                sys.exit(0)
+            elif option in long_flags and not has_value:
+                setattr(args, flags[long_flags[option]], True)
+            elif option in long_values:
+                i = set_value(long_values[option], value if has_value else None, i)
+            elif option == "--images":
+                # Repeating the option adds to the earlier paths
+                if args.image_paths is None:
+                    args.image_paths = []
+                if has_value:
+                    args.image_paths.append(value)
+                else:
+                    while i + 1 < len(argv) and not argv[i + 1].startswith("-"):
+                        i += 1
+                        args.image_paths.append(argv[i])
+            else:
+                parse_error(f"unrecognized arguments: {arg}")
+        elif arg.startswith("-") and len(arg) > 1:
+            # Short options may be bundled (-cs) and take attached values (-e5)
+            for j, short in enumerate(arg[1:], start=2):
+                if short == "h":
+                    sys.stdout.write(HELP)
+                    sys.exit(0)
+                elif short in flags:
+                    setattr(args, flags[short], True)
+                elif short in ("e", "a"):
+                    i = set_value(short, arg[j:] or None, i)
+                    break
+                else:
+                    parse_error(f"unrecognized arguments: {arg}")
+        else:
+            set_mode(arg)
+        i += 1
+    
+    if args.mode is None:
+        parse_error("the following arguments are required: mode")
+    
+    return args
+
+
+def main() -> None:
+    """Parses the command line arguments and runs the chosen mode."""
+    if len(sys.argv) < 2:
+        sys.stdout.write(HELP)
+        sys.exit(0)
+    
+    args = parse_args(sys.argv[1:])
+    MODES[args.mode](args)
+
+
+if __name__ == "__main__":
+    main()